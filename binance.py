@@ -7,27 +7,96 @@ API的封装越来越没有必要
 """
 
 import json
+import math
+import orjson
 import hmac
+import logging
+import random
+import ssl
 import time
 import traceback
-from typing import Union, Dict, List, Callable
-import requests
-import math
+from typing import Union, Dict, List, Tuple, Callable
+import httpx
+from decimal import Decimal, ROUND_FLOOR, ROUND_CEILING, ROUND_HALF_EVEN, localcontext
 import threading
 from hashlib import sha256
 import websockets
 import asyncio
-import functools
+from urllib.parse import urlencode
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
 
 """
 此脚本用于放置对币安API的封装
 """
 
 base_url = 'binance.com'  # 基本网址，用于快速切换国内地址和国际地址，国际地址是binance.com
-only_print_error = True  # 是否仅仅打印错误请求，开启后只会打印出错误请求，但不会影响追踪文件写入
+# 请求追踪通过名为binance的logger输出，错误请求为ERROR级别，其余为INFO级别
+# 关闭only_print_error后，需要调用方开启binance logger的INFO级别日志才能看到输出，例如logging.basicConfig(level=logging.INFO)
+only_print_error = True  # 是否仅仅输出错误请求，开启后只会输出错误请求的日志，但不会影响追踪文件写入
 trace_to_file = False  # 是否将追踪请求写入到文件
-print_simple_trace = True  # 开启后只会在控制台显示精简请求，但是错误请求会永远显示完整版
-proxy_url = None  # 不为None则使用该地址转发代理
+print_simple_trace = True  # 开启后INFO级别的日志只会输出精简请求，但是错误请求会永远输出完整版
+proxy_url = None  # 不为None则使用该地址转发代理，需要在Client发出第一个请求之前设置
+batch_proxy_url = None  # 不为None则batch_request会把请求一次性发给该地址(proxy.py的/batch)转发
+max_retry_after = 60  # 被限频时最多按照Retry-After等待的秒数，超过则不再等待直接抛出异常
+precision_cache_ttl = 600  # 交易对精度缓存的有效时间(秒)，exchangeInfo体积很大，没必要每次下单都重新获取
+
+# 请求追踪的输出格式，使用logging的延迟格式化，被过滤掉的日志不会拼接字符串
+_TRACE_FORMAT = '-----start-----\nURL: %s\nSTATUS CODE: %s\nTEXT: %s\n-----ended-----'
+
+# 请求追踪使用的logger，输出方式由调用方通过logging配置决定
+# 未配置时，错误请求仍会通过logging的默认处理输出到stderr，info级别的追踪需要调用方开启
+logger = logging.getLogger('binance')
+
+# 签名使用的sha256由OpenSSL提供，1.1.1以下的版本不会使用SHA-NI等硬件加速
+if ssl.OPENSSL_VERSION_INFO < (1, 1, 1):
+    logger.warning('当前OpenSSL版本为%s，低于1.1.1，请求签名无法使用硬件加速', ssl.OPENSSL_VERSION)
+
+# 参数校验用的集合，在导入时生成一次，校验时使用in判断
+_MODES_ALL = frozenset({'MAIN', 'MARGIN', 'ISOLATED', 'FUTURE'})
+_MODES_SPOT_FUTURE = frozenset({'MAIN', 'FUTURE'})
+_MODES_MARGIN = frozenset({'MARGIN', 'ISOLATED'})
+_MODES_ASSET = frozenset({'MAIN', 'FUTURE', 'MARGIN'})
+_METHODS = frozenset({'POST', 'GET', 'PUT'})
+_SIDES = frozenset({'BUY', 'SELL'})
+
+# 各mode对应的接口，在导入时生成一次，调用时直接查表，不再逐个比较字符串
+# listen_key接口 (area_url, path_url)
+_LISTEN_KEY_ENDPOINTS = {
+    'MAIN': ('api', '/api/v3/userDataStream'),
+    'MARGIN': ('api', '/sapi/v1/userDataStream'),
+    'ISOLATED': ('api', '/sapi/v1/userDataStream/isolated'),
+    'FUTURE': ('fapi', '/fapi/v1/listenKey')
+}
+# 最新价格接口 (area_url, path_url)
+_TICKER_ENDPOINTS = {
+    'MAIN': ('api', '/api/v3/ticker/price'),
+    'FUTURE': ('fapi', '/fapi/v1/ticker/price')
+}
+# 交易规则接口 (area_url, path_url, 精度字段)
+_EXCHANGE_INFO_ENDPOINTS = {
+    'MAIN': ('api', '/api/v3/exchangeInfo', 'baseAssetPrecision'),
+    'FUTURE': ('fapi', '/fapi/v1/exchangeInfo', 'quantityPrecision')
+}
+# 下单接口 (area_url, path_url)
+_ORDER_ENDPOINTS = {
+    'MAIN': ('api', '/api/v3/order'),
+    'FUTURE': ('fapi', '/fapi/v1/order'),
+    'MARGIN': ('api', '/sapi/v1/margin/order'),
+    'ISOLATED': ('api', '/sapi/v1/margin/order')
+}
+# 账户资产接口 (area_url, path_url, 资产列表字段，None代表返回的就是列表, 可用数量字段)
+_ACCOUNT_ENDPOINTS = {
+    'MAIN': ('api', '/api/v3/account', 'balances', 'free'),
+    'FUTURE': ('fapi', '/fapi/v2/balance', None, 'maxWithdrawAmount'),
+    'MARGIN': ('api', '/sapi/v1/margin/account', 'userAssets', 'free'),
+    'ISOLATED': ('api', '/sapi/v1/margin/isolated/account', 'assets', 'free')
+}
+# websocket地址模板，使用base_url和stream_name格式化
+_WEBSOCKET_URLS = {
+    'MAIN': 'wss://stream.{}:9443/ws/{}',
+    'FUTURE': 'wss://fstream.{}/ws/{}'
+}
 
 
 class BinanceException(Exception):
@@ -41,7 +110,7 @@ class BinanceException(Exception):
         self.response = response
 
 
-class CantRetryException(Exception):
+class CantRetryException(BinanceException):
     def __init__(self, status_code, response):
         """
         经过一定程度的判断，无法简单retry解决就返回此异常
@@ -51,26 +120,51 @@ class CantRetryException(Exception):
         self.response = response
 
 
+_last_ts_ms = 0  # 上次获取的毫秒级时间
+_last_ts_str = ''  # 上次获取的毫秒级时间对应的str
+
+
 def get_timestamp():
     """
-    获取币安常用的毫秒级timestamp
+    获取币安常用的毫秒级timestamp\n
+    同一毫秒内重复调用会直接返回缓存的str
     """
-    return str(round(time.time() * 1000))
+    global _last_ts_ms, _last_ts_str
+    now = time.time_ns() // 1_000_000
+    if now != _last_ts_ms:
+        _last_ts_ms = now
+        _last_ts_str = str(now)
+    return _last_ts_str
+
+
+# 预先生成各精度对应的量化单位，_QUANTIZERS[p]即为10的-p次方
+_QUANTIZERS = [Decimal(1).scaleb(-p) for p in range(19)]
+
+
+def _float_to_decimal_str(amount: Union[str, float, int], precision: int, rounding: str) -> str:
+    """
+    使用Decimal将数字按指定精度和取整方式转为str，不会出现float乘除带来的误差，也不会出现科学计数法
+    """
+    # float先转为str，使用最短的十进制表示，避免把二进制误差带进Decimal
+    d = Decimal(amount) if isinstance(amount, int) else Decimal(str(amount))
+    q = _QUANTIZERS[precision] if 0 <= precision < len(_QUANTIZERS) else Decimal(1).scaleb(-precision)
+    # 默认上下文只有28位有效数字，大数或者高精度时quantize会出错，按照需要的位数临时放宽
+    with localcontext() as ctx:
+        ctx.prec = max(ctx.prec, d.adjusted() + precision + 2)
+        d = d.quantize(q, rounding=rounding)
+    # -0.0或者取整后为0的负数会得到-0，统一返回0
+    if d == 0:
+        return '0'
+    return format(d.normalize(), 'f')
 
 
 def float_to_str_floor(amount: float, precision: int = 8) -> str:
     """
     将float转为指定精度的str格式，一般用于对高精度计算结果下单，会向下取整避免多下\n
     如不指定精度，则默认为币安最大精度8\n
-    对于str格式，会自动转为float再进行精度转换
+    对于str格式，会直接按照str的数字进行精度转换
     """
-    if isinstance(amount, str):
-        amount = float(amount)
-    res = str(math.floor(amount * (10 ** precision)) / (10 ** precision))
-    # 如果最后结尾是.0，则把.0消除
-    if res[-2:] == '.0':
-        res = res[:-2]
-    return res
+    return _float_to_decimal_str(amount, precision, ROUND_FLOOR)
 
 
 def float_to_str_ceil(amount: float, precision: int = 8) -> str:
@@ -78,44 +172,182 @@ def float_to_str_ceil(amount: float, precision: int = 8) -> str:
     将float转为指定精度的str格式，一般用于对高精度计算结果下单，会向上取整避免少下\n
     如不指定精度，则默认币安最大精度8
     """
-    if isinstance(amount, str):
-        amount = float(amount)
-    res = str(math.ceil(amount * (10 ** precision)) / (10 ** precision))
-    # 如果最后结尾是.0，则把.0消除
-    if res[-2:] == '.0':
-        res = res[:-2]
-    return res
+    return _float_to_decimal_str(amount, precision, ROUND_CEILING)
 
 
 def float_to_str_round(amount: float, precision: int = 8) -> str:
     """
     将float转为指定精度的str格式，一般用于消除0.000000000001和0.9999999999\n
-    会对指定精度四舍五入，如不指定精度，则默认币安最大精度8
+    会对指定精度四舍五入(银行家舍入，与内置round一致)，如不指定精度，则默认币安最大精度8
     """
-    if isinstance(amount, str):
-        amount = float(amount)
-    res = str(round(amount * (10 ** precision)) / (10 ** precision))
-    # 如果最后结尾是.0，则把.0消除
-    if res[-2:] == '.0':
-        res = res[:-2]
-    return res
+    return _float_to_decimal_str(amount, precision, ROUND_HALF_EVEN)
 
 
-def make_query_string(**kwargs) -> str:
+def _is_timestamp_error(text: str) -> bool:
     """
-    这个函数会接收任意个参数，并返回对应的GET STRING
-    :return: 返回格式为aaa=xxx&bbb=xxx&ccc=xxx
+    判断返回内容是否为timestamp超出recvWindow的错误(-1021)，这种错误更新timestamp后可以重试
+    """
+    try:
+        return orjson.loads(text).get('code') == -1021
+    except (orjson.JSONDecodeError, AttributeError):
+        return False
+
 
+def _parse_retry_after(retry_after: Union[str, None]) -> Union[float, None]:
+    """
+    解析Retry-After头，可以是秒数或者HTTP日期，无法解析时返回None
     """
-    res = ''
-    if len(kwargs.keys()) != 0:
+    if retry_after is None:
+        return None
+    try:
+        seconds = float(retry_after)
+    except ValueError:
         pass
     else:
-        return ''
-    for key in kwargs.keys():
-        res += key + '=' + str(kwargs[key]) + '&'
-    res = res[:len(res) - 1]  # 删掉最后多余的&
-    return res
+        # nan、inf之类的值无法用于等待，当作无法解析
+        return max(seconds, 0) if math.isfinite(seconds) else None
+    try:
+        retry_at = parsedate_to_datetime(retry_after)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max((retry_at - datetime.now(timezone.utc)).total_seconds(), 0)
+
+
+def _status_exception(status: int, text: str, auto_timestamp: bool = False) -> BinanceException:
+    """
+    根据状态码生成对应的异常\n
+    除限频(429/418)外的4xx属于请求本身的错误，返回CantRetryException\n
+    开启auto_timestamp时，timestamp过期(-1021)更新后可以重试，不算请求本身的错误
+    """
+    if 400 <= status < 500 and status != 429 and status != 418 and \
+            not (auto_timestamp and _is_timestamp_error(text)):
+        return CantRetryException(status, text)
+    return BinanceException(status, text)
+
+
+def make_query_string(**kwargs) -> str:
+    """
+    这个函数会接收任意个参数，并返回对应的GET STRING，值会自动进行百分号编码
+    :return: 返回格式为aaa=xxx&bbb=xxx&ccc=xxx
+
+    """
+    return urlencode(kwargs, doseq=True)
+
+
+class PriceBatcher(object):
+    def __init__(self, client: 'Client', mode: str, batch_interval_ms: int = 10, max_batch_size: int = 100):
+        """
+        将一小段时间内对同一mode的最新价格查询合并成一次请求\n
+        只有一个查询时直接使用symbol参数查询，不等待也不合并\n
+        多个查询时，现货使用ticker/price的symbols参数一次查询多个交易对，期货不支持symbols参数，则一次获取全部价格\n
+        合并请求因为请求错误(例如其中有无效的交易对)失败时，会退回为逐个查询，只有出错的交易对会收到异常\n
+        限频、网络错误等其他失败不会逐个重试，同批次的查询都会收到同一个异常\n
+        :param client: 用于发送请求的Client
+        :param mode: MAIN或者FUTURE，代表现货或者期货
+        :param batch_interval_ms: 有多个查询时，合并请求的等待窗口(毫秒)
+        :param max_batch_size: 单次合并的最大交易对数量，达到后立即发送
+        """
+        self.client = client
+        self.mode = mode
+        self.batch_interval_ms = batch_interval_ms
+        self.max_batch_size = max_batch_size
+        self.pending: List[Tuple[str, asyncio.Future]] = []
+        # Event会绑定到事件循环，因此每次启动后台任务时重新创建，Client可以跨多个事件循环使用
+        self._full: Union[asyncio.Event, None] = None
+        self._task: Union[asyncio.Task, None] = None
+
+    async def get_price(self, symbol: str) -> float:
+        """
+        查询某个交易对的最新价格，会等待所在批次的请求完成后返回
+        :param symbol: 大写的交易对符号
+        """
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append((symbol, future))
+        # 第一次使用或者上一个后台任务已经处理完毕，则启动新的后台任务
+        if self._task is None or self._task.done():
+            self._full = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+        elif len(self.pending) >= self.max_batch_size:
+            self._full.set()
+        return await future
+
+    async def _run(self):
+        batch: List[Tuple[str, asyncio.Future]] = []
+        try:
+            # 先让出一次事件循环，让同时发起的查询(例如asyncio.gather)都进入队列
+            await asyncio.sleep(0)
+            while self.pending:
+                # 有多个查询时才等待窗口结束，或者待处理数量达到上限
+                if 1 < len(self.pending) < self.max_batch_size:
+                    try:
+                        await asyncio.wait_for(self._full.wait(), self.batch_interval_ms / 1000)
+                    except asyncio.TimeoutError:
+                        pass
+                self._full.clear()
+                batch = self.pending[:self.max_batch_size]
+                self.pending = self.pending[self.max_batch_size:]
+
+                symbols = sorted({e[0] for e in batch})
+                if len(symbols) == 1:
+                    prices = await self._fetch_each(symbols)
+                else:
+                    try:
+                        prices = await self._fetch(symbols)
+                    except CantRetryException:
+                        # 合并请求因为请求本身错误(例如有无效的交易对)失败，逐个查询，避免连累同批次的其他查询
+                        prices = await self._fetch_each(symbols)
+                    except Exception as e:
+                        # 限频、网络错误等，逐个重试只会放大请求数量，整批返回同一个异常
+                        prices = dict.fromkeys(symbols, e)
+                for symbol, future in batch:
+                    if future.done():
+                        continue
+                    price = prices.get(symbol)
+                    if price is None:
+                        future.set_exception(Exception('没有找到查询的交易对价格', symbol))
+                    elif isinstance(price, Exception):
+                        future.set_exception(price)
+                    else:
+                        future.set_result(price)
+                batch = []
+        except asyncio.CancelledError:
+            # 后台任务被取消时，同时取消所有还在等待的查询
+            for _, future in batch + self.pending:
+                future.cancel()
+            self.pending = []
+            raise
+        except Exception as e:
+            # 后台任务出现意外错误，把异常交给所有还在等待的查询，避免调用方一直等待
+            for _, future in batch + self.pending:
+                if not future.done():
+                    future.set_exception(e)
+            self.pending = []
+
+    async def _fetch_each(self, symbols: List[str]) -> Dict[str, Union[float, Exception]]:
+        """
+        使用symbol参数逐个并发查询，出错的交易对对应的值为异常
+        """
+        res = await asyncio.gather(*[self._fetch_one(e) for e in symbols], return_exceptions=True)
+        return dict(zip(symbols, res))
+
+    async def _fetch_one(self, symbol: str) -> float:
+        area_url, path_url = _TICKER_ENDPOINTS[self.mode]
+        price = await self.client.request(area_url, path_url, 'GET', {
+            'symbol': symbol
+        }, send_signature=False)
+        return float(price['price'])
+
+    async def _fetch(self, symbols: List[str]) -> Dict[str, float]:
+        if self.mode == 'MAIN':
+            area_url, path_url = _TICKER_ENDPOINTS['MAIN']
+            price = await self.client.request(area_url, path_url, 'GET', {
+                'symbols': orjson.dumps(symbols).decode()
+            }, send_signature=False)
+            return {e['symbol']: float(e['price']) for e in price}
+        else:
+            return await self.client.get_all_latest_price('FUTURE')
 
 
 class Client(object):
@@ -127,14 +359,149 @@ class Client(object):
             self.public_key = jsons['binance_public_key']
             self.private_key = jsons['binance_private_key']
 
-        # 创建一个共用session
-        self.session = requests.Session()
+        # 预先计算好HMAC的密钥状态，每次签名只需要copy一份，无需重新编码密钥和派生内外层密钥
+        self._hmac_key = self.private_key.encode('ascii')
+        self._hmac_template = hmac.new(self._hmac_key, b'', sha256)
+
+        # 共用session，在第一次请求时创建，这样Client()可以在事件循环之外构造
+        self.session: Union[httpx.AsyncClient, None] = None
+        # 发往batch_proxy_url的session，第一次使用时创建
+        self._batch_session: Union[httpx.AsyncClient, None] = None
+
+        # 交易对精度缓存，key为mode，值为(缓存时间, {symbol: 精度})
+        self._precision_cache: Dict[str, Tuple[float, Dict[str, int]]] = {}
+        # 每个mode一把锁，避免缓存过期时并发请求同时去刷新exchangeInfo
+        self._precision_lock: Dict[str, asyncio.Lock] = {
+            'MAIN': asyncio.Lock(),
+            'FUTURE': asyncio.Lock()
+        }
+
+        # 最新价格查询的合并器，同一时间窗口内的查询只发送一次请求
+        self._price_batcher: Dict[str, PriceBatcher] = {
+            'MAIN': PriceBatcher(self, 'MAIN'),
+            'FUTURE': PriceBatcher(self, 'FUTURE')
+        }
+        # 追踪文件的写入队列和后台写入任务
+        self._trace_q: asyncio.Queue = asyncio.Queue()
+        self._trace_task: Union[asyncio.Task, None] = None
+
+    async def close(self):
+        """
+        关闭共用session，释放连接池，并等待追踪文件写入完毕
+        """
+        try:
+            await self._stop_trace_worker()
+        finally:
+            if self._batch_session is not None:
+                await self._batch_session.aclose()
+                self._batch_session = None
+            if self.session is not None:
+                await self.session.aclose()
+                self.session = None
+
+    async def _stop_trace_worker(self):
+        """
+        等待追踪记录全部写入后停止后台写入任务，后台任务出错时在这里抛出异常
+        """
+        task = self._trace_task
+        if task is None:
+            return
+        self._trace_task = None
+        # 等待队列写完，如果后台任务已经异常退出，则不会再等待队列
+        join = asyncio.ensure_future(self._trace_q.join())
+        await asyncio.wait({join, task}, return_when=asyncio.FIRST_COMPLETED)
+        join.cancel()
+        if task.done():
+            # 后台任务出错退出，把异常抛给调用方
+            task.result()
+            return
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    def _get_session(self) -> httpx.AsyncClient:
+        """
+        获取共用session，不存在时创建\n
+        开启HTTP/2，并发请求可以复用同一个连接，避免每次请求都重新握手
+        """
+        if self.session is None:
+            self.session = httpx.AsyncClient(
+                http2=True, proxy=proxy_url, timeout=httpx.Timeout(10.0),
+                limits=httpx.Limits(max_connections=100, max_keepalive_connections=50, keepalive_expiry=75))
+        return self.session
+
+    def _put_trace(self, trace: str):
+        """
+        将一条追踪记录放入队列，第一次使用时启动后台写入任务
+        """
+        if self._trace_task is None:
+            self._trace_task = asyncio.create_task(self._trace_worker())
+        elif self._trace_task.done():
+            # 后台任务已经出错退出，不再堆积记录，异常会在close时抛出
+            return
+        self._trace_q.put_nowait(trace)
+
+    async def _trace_worker(self):
+        """
+        后台写入追踪文件，整个生命周期只打开一次文件，队列清空时才flush\n
+        文件操作都放到线程中执行，不阻塞事件循环
+        """
+        f = await asyncio.to_thread(open, 'requests_trace.txt', 'a+', encoding='utf-8')
+        try:
+            while True:
+                trace = await self._trace_q.get()
+                try:
+                    await asyncio.to_thread(f.write, trace)
+                    if self._trace_q.empty():
+                        await asyncio.to_thread(f.flush)
+                finally:
+                    self._trace_q.task_done()
+        finally:
+            await asyncio.to_thread(f.close)
+
+    async def __aenter__(self):
+        self._get_session()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    def _make_url(self, area_url: str, path_url: str, data: Union[dict, str], test: bool, send_signature: bool,
+                  auto_timestamp: bool = False) -> str:
+        """
+        根据参数生成完整的请求地址，需要签名时会在末尾附上signature
+        """
+        if test:
+            test_path = '/test'
+        else:
+            test_path = ''
+        if isinstance(data, dict):
+            # 如果启用了auto_timestamp，则忽略掉用户传入的timestamp，并且重新生成一个新的
+            if auto_timestamp:
+                data['timestamp'] = get_timestamp()
+            str_data = urlencode(data, doseq=True)
+
+        elif isinstance(data, str):
+            str_data = data
+        else:
+            raise Exception('data格式错误，必须为dict，或者使用make_query_string转换后的str')
+        url = 'https://' + area_url + '.' + base_url + path_url + test_path + '?' + str_data
+        if send_signature:
+            mac = self._hmac_template.copy()
+            mac.update(str_data.encode('ascii'))
+            url += '&signature=' + mac.hexdigest()
+        return url
 
     async def request(self, area_url: str, path_url, method: str, data: dict, test=False, send_signature=True,
-                      retry_count: int = 3, retry_interval: int = 0, auto_timestamp: bool = False) -> Dict:
+                      retry_count: int = 3, retry_interval: float = 0, auto_timestamp: bool = False) -> Dict:
         """
         用于向币安发送请求的内部API\n
         如果请求状态码不是200，会引发BinanceException\n
+        重试之间使用带随机抖动的指数退避，被限频(429/418)时按照Retry-After等待\n
+        Retry-After超过max_retry_after时不再等待，直接引发BinanceException\n
+        除限频外的4xx属于请求本身的错误，不会重试，直接引发CantRetryException\n
         默认会将返回结果解析为json\n
         :param area_url: 头部的地址，例如api、fapi、dapi
         :param path_url: 路径地址，例如/fapi/v2/account
@@ -143,96 +510,123 @@ class Client(object):
         :param test: 是否添加/test路径，用于测试下单，默认False
         :param send_signature: 是否发送签名，有的api不接受多余的参数，就不能默认发送签名
         :param retry_count: 返回状态码不为200时，自动重试的次数
-        :param retry_interval: 自动尝试的间隔(秒)
+        :param retry_interval: 首次重试的间隔(秒)，之后每次翻倍，为0则从0.1秒开始
         :param auto_timestamp: 是否自动添加timestamp并且在重试时自动更新timestamp
         :return: 返回的数据文本格式
         """
+        backoff = retry_interval or 0.1
         while True:
             method = method.upper()
-            if method != 'POST' and method != 'GET' and method != 'PUT':
+            if method not in _METHODS:
                 raise Exception('请求方法必须为POST、GET、PUT，大小写不限')
             headers = {
                 'X-MBX-APIKEY': self.public_key
             }
-            if test:
-                test_path = '/test'
-            else:
-                test_path = ''
-            if isinstance(data, dict):
-                # 如果启用了auto_timestamp，则忽略掉用户传入的timestamp，并且重新生成一个新的
-                if auto_timestamp:
-                    data['timestamp'] = get_timestamp()
-                str_data = make_query_string(**data)
-
-            elif isinstance(data, str):
-                str_data = data
-            else:
-                raise Exception('data格式错误，必须为dict，或者使用make_query_string转换后的str')
-            signature = hmac.new(self.private_key.encode('ascii'),
-                                 str_data.encode('ascii'), digestmod=sha256).hexdigest()
-            if send_signature:
-                url = 'https://{}.{}{}{}?{}&signature={}'.format(
-                    area_url, base_url, path_url, test_path, str_data, signature)
-            else:
-                url = 'https://{}.{}{}{}?{}'.format(
-                    area_url, base_url, path_url, test_path, str_data)
+            url = self._make_url(area_url, path_url, data, test, send_signature, auto_timestamp)
 
-            if method == 'GET':
-                func = self.session.get
-            elif method == 'POST':
-                func = self.session.post
-            else:
-                func = self.session.put
-
-            if proxy_url is None:
-                proxies = None
-            else:
-                proxies = {
-                    'http': proxy_url,
-                    'https': proxy_url
-                }
-
-            r: requests.Response = await asyncio.get_running_loop(). \
-                run_in_executor(None, functools.partial(func, url, headers=headers, proxies=proxies))
+            r = await self._get_session().request(method, url, headers=headers)
+            body = r.content
+            status = r.status_code
+            retry_after = r.headers.get('Retry-After')
 
+            # 不需要输出追踪时直接解析bytes，省去把整个返回内容解码为str
+            if status == 200 and only_print_error and not trace_to_file:
+                return orjson.loads(body)
+            text = body.decode('utf-8', errors='replace')
             if not only_print_error:
                 if print_simple_trace:
-                    print('-----start-----')
-                    print('URL:', url)
-                    print('STATUS CODE:', r.status_code)
-                    print('TEXT:', r.text[:50])
-                    print('-----ended-----')
+                    logger.info(_TRACE_FORMAT, url, status, text[:50])
                 else:
-                    print('-----start-----')
-                    print('URL:', url)
-                    print('STATUS CODE:', r.status_code)
-                    print('TEXT:', r.text)
-                    print('-----ended-----')
+                    logger.info(_TRACE_FORMAT, url, status, text)
             if trace_to_file:
-                with open('requests_trace.txt', 'a+', encoding='utf-8') as f:
-                    f.writelines([
-                        '-----start-----\n',
-                        'URL: {}\n'.format(url),
-                        'STATUS CODE: {}\n'.format(r.status_code),
-                        'TEXT: {}\n'.format(r.text),
-                        '-----ended-----\n'
-                    ])
-            if r.status_code != 200:
+                # 交给后台任务写入文件，避免在事件循环里打开文件阻塞
+                self._put_trace(_TRACE_FORMAT % (url, status, text) + '\n')
+            if status != 200:
                 if only_print_error:
-                    print('-----start-----')
-                    print('URL:', url)
-                    print('STATUS CODE:', r.status_code)
-                    print('TEXT:', r.text)
-                    print('-----ended-----')
+                    logger.error(_TRACE_FORMAT, url, status, text)
+                error = _status_exception(status, text, auto_timestamp)
+                if isinstance(error, CantRetryException):
+                    raise error
                 if retry_count > 0:
                     retry_count -= 1
                 else:
-                    raise BinanceException(r.status_code, r.text)
+                    raise error
+            else:
+                return orjson.loads(body)
+
+            # 被限频时按照服务器建议的时间等待，其余情况指数退避并加上随机抖动
+            if status == 429 or status == 418:
+                wait = _parse_retry_after(retry_after)
+                if wait is None:
+                    wait = backoff
+                if wait > max_retry_after:
+                    raise BinanceException(status, '被限频，需要等待{}秒，超过了max_retry_after: {}'.format(wait, text))
             else:
-                return r.json()
+                wait = backoff + random.random() * 0.1
+            await asyncio.sleep(wait)
+            backoff = min(backoff * 2, 30)
 
-            # 等待一定时间之后再重试
-            await asyncio.sleep(retry_interval)
+    async def batch_request(self, request_list: List[dict]) -> List[Union[Dict, BinanceException]]:
+        """
+        批量发送请求，设置了batch_proxy_url时会把所有请求一次性发给proxy.py的/batch并发转发\n
+        未设置时则在本地并发调用request\n
+        返回结果与传入顺序一致，失败的请求对应位置为异常对象而不会直接抛出：\n
+        请求本身错误(除限频外的4xx)为CantRetryException，其它状态码为BinanceException，
+        网络错误等没有拿到响应的情况为状态码0的BinanceException\n
+        :param request_list: 每个元素为dict，包含request的参数area_url、path_url、method、data，
+        可选test、send_signature、auto_timestamp
+        :return: 每个请求解析后的json或者BinanceException
+        """
+        if batch_proxy_url is None:
+            return await asyncio.gather(*[self._request_or_exception(e) for e in request_list])
+
+        items = []
+        for e in request_list:
+            method = e['method'].upper()
+            if method not in _METHODS:
+                raise Exception('请求方法必须为POST、GET、PUT，大小写不限')
+            url = self._make_url(e['area_url'], e['path_url'], e['data'], e.get('test', False),
+                                 e.get('send_signature', True), e.get('auto_timestamp', False))
+            items.append({
+                'method': method,
+                'url': url,
+                'api_key': self.public_key
+            })
+
+        # proxy.py使用自签名证书，因此不校验证书
+        if self._batch_session is None:
+            self._batch_session = httpx.AsyncClient(verify=False, timeout=httpx.Timeout(30.0))
+        r = await self._batch_session.post(batch_proxy_url, content=orjson.dumps(items), headers={
+            'Content-Type': 'application/json'
+        })
+        body = r.content
+        status = r.status_code
+        if status != 200:
+            raise BinanceException(status, body.decode('utf-8', errors='replace'))
+        res = orjson.loads(body)
+        if isinstance(res, dict):
+            raise Exception('批量请求转发失败', res.get('traceback'))
+
+        result = []
+        for e, item in zip(res, request_list):
+            if e['status'] == 200:
+                result.append(orjson.loads(e['data']))
+            else:
+                result.append(_status_exception(e['status'], e['data'], item.get('auto_timestamp', False)))
+        return result
+
+    async def _request_or_exception(self, e: dict) -> Union[Dict, BinanceException]:
+        """
+        调用request，出错时返回异常而不是抛出，网络错误转换为状态码0的BinanceException
+        """
+        try:
+            return await self.request(**e)
+        except BinanceException as error:
+            return error
+        except httpx.HTTPError as error:
+            exception = BinanceException(0, repr(error))
+            exception.__cause__ = error
+            return exception
 
     async def create_listen_key(self, mode: str, symbol: str = None) -> str:
         """
@@ -241,29 +635,18 @@ class Client(object):
         :param symbol: 仅逐仓需要传入，代表哪个逐仓
         :return: 返回的listen_key
         """
-        if mode != 'MAIN' and mode != 'FUTURE' and mode != 'MARGIN' and mode != 'ISOLATED':
+        try:
+            area_url, path_url = _LISTEN_KEY_ENDPOINTS[mode]
+        except KeyError:
             raise Exception('mode必须为MAIN、MARGIN、ISOLATED、FUTURE')
-        if mode == 'MAIN':
-            res = await self.request('api', '/api/v3/userDataStream', 'POST', {}, send_signature=False)
-            res = res['listenKey']
-            return res
-        elif mode == 'MARGIN':
-            res = await self.request('api', '/sapi/v1/userDataStream', 'POST', {}, send_signature=False)
-            res = res['listenKey']
-            return res
-        elif mode == 'ISOLATED':
+        data = {}
+        if mode == 'ISOLATED':
             if symbol is None:
                 raise Exception('需要传入逐仓的symbol')
-            symbol = symbol.upper()
-            res = await self.request('api', '/sapi/v1/userDataStream/isolated', 'POST', {
-                'symbol': symbol
-            }, send_signature=False)
-            res = res['listenKey']
-            return res
-        else:
-            res = await self.request('fapi', '/fapi/v1/listenKey', 'POST', {}, send_signature=False)
-            res = res['listenKey']
-            return res
+            data['symbol'] = symbol.upper()
+        res = await self.request(area_url, path_url, 'POST', data, send_signature=False)
+        res = res['listenKey']
+        return res
 
     async def overtime_listen_key(self, mode: str, key: str, symbol: str = None):
         """
@@ -273,28 +656,39 @@ class Client(object):
         :param key: 要延长的listen_key
         :param symbol: 仅逐仓需要传入，代表哪个逐仓
         """
-        if mode != 'MAIN' and mode != 'FUTURE' and mode != 'MARGIN' and mode != 'ISOLATED':
+        try:
+            area_url, path_url = _LISTEN_KEY_ENDPOINTS[mode]
+        except KeyError:
             raise Exception('mode必须为MAIN、MARGIN、ISOLATED、FUTURE')
-        elif mode == 'MAIN':
-            await self.request('api', '/api/v3/userDataStream', 'PUT', {
-                'listenKey': key
-            }, send_signature=False)
-        elif mode == 'MARGIN':
-            await self.request('api', '/sapi/v1/userDataStream', 'PUT', {
-                'listenKey': key
-            }, send_signature=False)
-        elif mode == 'ISOLATED':
+        data = {
+            'listenKey': key
+        }
+        if mode == 'ISOLATED':
             if symbol is None:
                 raise Exception('需要传入逐仓的symbol')
-            symbol = symbol.upper()
-            await self.request('api', '/sapi/v1/userDataStream/isolated', 'PUT', {
-                'listenKey': key,
-                'symbol': symbol
-            }, send_signature=False)
-        else:
-            await self.request('fapi', '/fapi/v1/listenKey', 'PUT', data={
-                'listenKey': key
-            }, send_signature=False)
+            data['symbol'] = symbol.upper()
+        await self.request(area_url, path_url, 'PUT', data, send_signature=False)
+
+    async def _get_precision_dict(self, mode: str) -> Dict[str, int]:
+        """
+        获取某个mode下所有交易对的精度字典，结果会缓存precision_cache_ttl秒\n
+        :param mode: 仅可为MAIN，FUTURE。代表现货和期货
+        :return: key为交易对，值为精度
+        """
+        cache = self._precision_cache.get(mode)
+        if cache is not None and time.time() - cache[0] < precision_cache_ttl:
+            return cache[1]
+        async with self._precision_lock[mode]:
+            # 拿到锁之后再检查一次，可能别的协程已经刷新过了
+            cache = self._precision_cache.get(mode)
+            if cache is not None and time.time() - cache[0] < precision_cache_ttl:
+                return cache[1]
+            # 获取每个交易对的规则（下单精度）
+            area_url, path_url, precision_key = _EXCHANGE_INFO_ENDPOINTS[mode]
+            info = await self.request(area_url, path_url, 'GET', {}, send_signature=False)
+            precision_dict = {e['symbol']: int(e[precision_key]) for e in info['symbols']}
+            self._precision_cache[mode] = (time.time(), precision_dict)
+            return precision_dict
 
     async def get_symbol_precision(self, symbol: str, mode: str = None) -> int:
         """
@@ -310,33 +704,20 @@ class Client(object):
             mode = mode.upper()
 
         # 判断mode有没有输入正确
-        if mode != 'MAIN' and mode != 'FUTURE' and mode is not None:
+        if mode is not None and mode not in _MODES_SPOT_FUTURE:
             raise Exception('mode输入错误，仅可输入MAIN或者FUTURE')
 
-        # 根据mode获取对应的交易对精度
-        if mode == 'MAIN':
-            # 获取每个 现货 交易对的规则（下单精度）
-            info = await self.request('api', '/api/v3/exchangeInfo', 'GET', {}, send_signature=False)
-            info = info['symbols']
-            # 在获取的结果里面找到需要的精度信息
-            for e in info:
-                # 找到对应交易对
-                if e['symbol'] == symbol:
-                    # 根据asset返回对应的精度
-                    return int(e['baseAssetPrecision'])
-            else:
-                raise Exception('没有找到欲查询的精度信息')
-        if mode == 'FUTURE':
-            info = await self.request('fapi', '/fapi/v1/exchangeInfo', 'GET', {}, send_signature=False)
-            info = info['symbols']
-            for e in info:
-                if e['symbol'] == symbol:
-                    return int(e['quantityPrecision'])
-            else:
+        # 根据mode从缓存中获取对应的交易对精度
+        if mode is not None:
+            precision_dict = await self._get_precision_dict(mode)
+            if symbol not in precision_dict:
                 raise Exception('没有找到欲查询的精度信息')
+            return precision_dict[symbol]
         if mode is None:
-            main_precision = await self.get_symbol_precision(symbol, 'MAIN')
-            future_precision = await self.get_symbol_precision(symbol, 'FUTURE')
+            # 现货和期货的精度互不依赖，并发查询
+            main_precision, future_precision = await asyncio.gather(
+                self.get_symbol_precision(symbol, 'MAIN'),
+                self.get_symbol_precision(symbol, 'FUTURE'))
             return min(main_precision, future_precision)
 
     async def trade_market(self, symbol: str, mode: str, amount: Union[str, float, int], side: str, test=False,
@@ -362,19 +743,21 @@ class Client(object):
         side = side.upper()
 
         # 判断mode是否填写正确
-        if mode != 'MAIN' and mode != 'FUTURE' and mode != 'MARGIN' and mode != 'ISOLATED':
+        if mode not in _MODES_ALL:
             raise Exception('交易mode填写错误，只能为MAIN FUTURE MARGIN ISOLATED')
 
         # 判断side是否填写正确
-        if side != 'BUY' and side != 'SELL':
+        if side not in _SIDES:
             raise Exception('交易side填写错误，只能为SELL或者BUY')
 
         # 如果期货用了成交额模式，则获取币价来计算下单货币数
         if mode == 'FUTURE' and volume_mode:
-            # 获取期货币价最新价格
-            latest_price = await self.get_latest_price(symbol, 'FUTURE')
-            # 一个除法计算要买多少币
-            amount = float(amount) / latest_price
+            # 并发获取期货币价最新价格和期货下单精度
+            latest_price, precision = await asyncio.gather(
+                self.get_latest_price(symbol, 'FUTURE'),
+                self.get_symbol_precision(symbol, 'FUTURE'))
+            # 一个除法计算要买多少币，并按照期货精度向下取整
+            amount = float_to_str_floor(float(amount) / latest_price, precision)
 
         # 如果amount是float格式则根据精度转换一下
         if isinstance(amount, float):
@@ -413,12 +796,8 @@ class Client(object):
             data['isIsolated'] = 'TRUE'
 
         # 根据期货现货不同，发出不同的请求
-        if mode == 'MAIN':
-            r = await self.request('api', '/api/v3/order', 'POST', data, test=test)
-        elif mode == 'FUTURE':
-            r = await self.request('fapi', '/fapi/v1/order', 'POST', data, test=test)
-        else:
-            r = await self.request('api', '/sapi/v1/margin/order', 'POST', data, test=test)
+        area_url, path_url = _ORDER_ENDPOINTS[mode]
+        r = await self.request(area_url, path_url, 'POST', data, test=test)
 
         return r
 
@@ -430,36 +809,27 @@ class Client(object):
         以及base_symbol和quote_asset两个资产符号\n
         :param mode: 只能为MARGIN、ISOLATED，代表全仓逐仓
         """
-        if mode != 'MARGIN' and mode != 'ISOLATED':
+        if mode not in _MODES_MARGIN:
             raise Exception('mode只能为MARGIN、ISOLATED')
-        # 根据mode调用不同API查询
-        asset_dict = {}
+        # 根据mode调用不同API查询当前所有的全仓或逐仓资产
+        area_url, path_url, list_key, _ = _ACCOUNT_ENDPOINTS[mode]
+        res = await self.request(area_url, path_url, 'GET', {
+            'timestamp': get_timestamp()
+        })
+        res = res[list_key]
         if mode == 'MARGIN':
-            # 获取当前所有的全仓资产
-            res = await self.request('api', '/sapi/v1/margin/account', 'GET', {
-                'timestamp': get_timestamp()
-            })
-            res = res['userAssets']
-            # 遍历将非零借贷塞入字典
-            for e in res:
-                if float(e['borrowed']) != 0:
-                    asset_dict[e['asset']] = float(e['borrowed'])
-        elif mode == 'ISOLATED':
-            # 获取当前所有的逐仓资产
-            res = await self.request('api', '/sapi/v1/margin/isolated/account', 'GET', {
-                'timestamp': get_timestamp()
-            })
-            res = res['assets']
-            # 遍历将非零资产塞入字典
-            for e in res:
-                if float(e['baseAsset']['borrowed']) != 0 or float(e['quoteAsset']['borrowed']) != 0:
-                    asset_dict[e['symbol']] = {}
-                    asset_dict[e['symbol']]['base_asset'] = float(e['baseAsset']['borrowed'])
-                    asset_dict[e['symbol']]['quote_asset'] = float(e['quoteAsset']['borrowed'])
-                    asset_dict[e['symbol']]['base_name'] = e['baseAsset']['asset']
-                    asset_dict[e['symbol']]['quote_name'] = e['quoteAsset']['asset']
+            # 将非零借贷塞入字典，每条记录只转换一次float
+            asset_dict = {e['asset']: v for e in res if (v := float(e['borrowed'])) != 0}
         else:
-            raise Exception('未知的mode', mode)
+            # 将非零借贷塞入字典
+            # 用元组比较保证base和quote都会被转换，不能用or短路，否则q可能未赋值
+            asset_dict = {e['symbol']: {
+                'base_asset': b,
+                'quote_asset': q,
+                'base_name': e['baseAsset']['asset'],
+                'quote_name': e['quoteAsset']['asset']
+            } for e in res
+                if ((b := float(e['baseAsset']['borrowed'])), (q := float(e['quoteAsset']['borrowed']))) != (0, 0)}
         return asset_dict
 
     async def get_all_asset_amount(self, mode: str) -> dict:
@@ -471,56 +841,29 @@ class Client(object):
         以及base_symbol和quote_asset两个资产符号\n
         :param mode: MAIN、MARGIN、ISOLATED、FUTURE 代表现货、全仓、逐仓、期货
         """
-        if mode != 'MAIN' and mode != 'FUTURE' and mode != 'MARGIN' and mode != 'ISOLATED':
+        if mode not in _MODES_ALL:
             raise Exception('mode只能为MAIN、FUTURE、MARGIN、ISOLATED')
 
-        # 根据mode调用不同API查询
-        asset_dict = {}
-        if mode == 'MAIN':
-            # 获取当前所有现货资产
-            res = await self.request('api', '/api/v3/account', 'GET', {
-                'timestamp': get_timestamp()
-            })
-            res = res['balances']
-            # 遍历将非零的资产塞入字典
-            for e in res:
-                if float(e['free']) != 0:
-                    asset_dict[e['asset']] = float(e['free'])
-        elif mode == 'FUTURE':
-            # 获取当前所有期货资产
-            res = await self.request('fapi', '/fapi/v2/balance', 'GET', {
-                'timestamp': get_timestamp()
-            })
-            # 遍历将非零资产塞入字典
-            for e in res:
-                if float(e['maxWithdrawAmount']) != 0:
-                    asset_dict[e['asset']] = float(e['maxWithdrawAmount'])
-        elif mode == 'MARGIN':
-            # 获取当前所有的全仓资产
-            res = await self.request('api', '/sapi/v1/margin/account', 'GET', {
-                'timestamp': get_timestamp()
-            })
-            res = res['userAssets']
-            # 遍历将非零资产塞入字典
-            for e in res:
-                if float(e['free']) != 0:
-                    asset_dict[e['asset']] = float(e['free'])
-        elif mode == 'ISOLATED':
-            # 获取当前所有的逐仓资产
-            res = await self.request('api', '/sapi/v1/margin/isolated/account', 'GET', {
-                'timestamp': get_timestamp()
-            })
-            res = res['assets']
-            # 遍历将非零资产塞入字典
-            for e in res:
-                if float(e['baseAsset']['free']) != 0 or float(e['quoteAsset']['free']) != 0:
-                    asset_dict[e['symbol']] = {}
-                    asset_dict[e['symbol']]['base_asset'] = float(e['baseAsset']['free'])
-                    asset_dict[e['symbol']]['quote_asset'] = float(e['quoteAsset']['free'])
-                    asset_dict[e['symbol']]['base_name'] = e['baseAsset']['asset']
-                    asset_dict[e['symbol']]['quote_name'] = e['quoteAsset']['asset']
+        # 根据mode调用不同API查询当前所有资产
+        area_url, path_url, list_key, amount_key = _ACCOUNT_ENDPOINTS[mode]
+        res = await self.request(area_url, path_url, 'GET', {
+            'timestamp': get_timestamp()
+        })
+        if list_key is not None:
+            res = res[list_key]
+        if mode == 'ISOLATED':
+            # 将非零资产塞入字典
+            # 用元组比较保证base和quote都会被转换，不能用or短路，否则q可能未赋值
+            asset_dict = {e['symbol']: {
+                'base_asset': b,
+                'quote_asset': q,
+                'base_name': e['baseAsset']['asset'],
+                'quote_name': e['quoteAsset']['asset']
+            } for e in res
+                if ((b := float(e['baseAsset'][amount_key])), (q := float(e['quoteAsset'][amount_key]))) != (0, 0)}
         else:
-            raise Exception('未知的mode', mode)
+            # 将非零的资产塞入字典，每条记录只转换一次float
+            asset_dict = {e['asset']: v for e in res if (v := float(e[amount_key])) != 0}
         return asset_dict
 
     async def get_asset_amount(self, symbol: str, mode: str) -> float:
@@ -534,36 +877,12 @@ class Client(object):
             symbol = symbol.upper()
         mode = mode.upper()
 
-        if mode != 'MAIN' and mode != 'FUTURE' and mode != 'MARGIN':
+        if mode not in _MODES_ASSET:
             raise Exception('mode只能为MAIN、FUTURE、MARGIN')
 
-        # 根据mode调用不同API查询
-        if mode == 'MAIN':
-            # 获取当前所有现货资产
-            asset_dict = await self.get_all_asset_amount(mode)
-            # 查询可用资产数量
-            if symbol not in asset_dict.keys():
-                return 0
-            else:
-                return asset_dict[symbol]
-        elif mode == 'FUTURE':
-            # 获取当前所有期货资产
-            asset_dict = await self.get_all_asset_amount(mode)
-            # 查询可用资产数量
-            if symbol not in asset_dict.keys():
-                return 0
-            else:
-                return asset_dict[symbol]
-        elif mode == 'MARGIN':
-            # 获取当前所有全仓资产
-            asset_dict = await self.get_all_asset_amount(mode)
-            # 查询可用资产数量
-            if symbol not in asset_dict.keys():
-                return 0
-            else:
-                return asset_dict[symbol]
-        else:
-            raise Exception('未知的mode', mode)
+        # 获取当前所有资产，再查询可用资产数量
+        asset_dict = await self.get_all_asset_amount(mode)
+        return asset_dict.get(symbol, 0)
 
     async def get_future_position(self, symbol: str = None) -> Union[float, dict]:
         """
@@ -579,19 +898,15 @@ class Client(object):
         res = res['positions']
         if symbol is not None:
             # 有symbol的情况下直接返回symbol的仓位
-            for e in res:
-                if e['symbol'] == symbol:
-                    return float(e['positionAmt'])
-            else:
+            # 仓位列表每次请求都是新的，只查一次没必要建字典，找到即返回
+            position = next((e for e in res if e['symbol'] == symbol), None)
+            if position is None:
                 raise Exception('没有找到查询的交易对仓位')
+            return float(position['positionAmt'])
         else:
             # 没有symbol的情况下返回交易对的仓位字典
-            all_price = {}
-            for e in res:
-                # 过滤掉仓位为0的交易对
-                if float(e['positionAmt']) != 0:
-                    all_price[e['symbol']] = float(e['positionAmt'])
-            return all_price
+            # 过滤掉仓位为0的交易对，每条记录只转换一次float
+            return {e['symbol']: v for e in res if (v := float(e['positionAmt'])) != 0}
 
     async def transfer_asset(self, mode: str, asset_symbol: str, amount: Union[str, float, int]):
         """
@@ -654,21 +969,11 @@ class Client(object):
         mode = mode.upper()
 
         # 判断mode是否填写正确
-        if mode != 'MAIN' and mode != 'FUTURE':
+        if mode not in _MODES_SPOT_FUTURE:
             raise Exception('交易mode填写错误，只能为MAIN或者FUTURE')
 
-        if mode == 'MAIN':
-            price = await self.request('api', '/api/v3/ticker/price', 'GET', {
-                'symbol': symbol
-            }, send_signature=False)
-            price = price['price']
-        else:
-            price = await self.request('fapi', '/fapi/v1/ticker/price', 'GET', {
-                'symbol': symbol
-            }, send_signature=False)
-            price = price['price']
-        price = float(price)
-        return price
+        # 交给合并器，与同一时间窗口内的其他查询合并成一次请求
+        return await self._price_batcher[mode].get_price(symbol)
 
     async def get_all_latest_price(self, mode: str) -> Dict[str, float]:
         """
@@ -678,18 +983,11 @@ class Client(object):
         mode = mode.upper()
 
         # 判断mode是否填写正确
-        if mode != 'MAIN' and mode != 'FUTURE':
+        if mode not in _MODES_SPOT_FUTURE:
             raise Exception('交易mode填写错误，只能为MAIN或者FUTURE')
-        res = {}
-        if mode == 'MAIN':
-            price = await self.request('api', '/api/v3/ticker/price', 'GET', {}, send_signature=False)
-            for e in price:
-                res[e['symbol']] = float(e['price'])
-        else:
-            price = await self.request('fapi', '/fapi/v1/ticker/price', 'GET', {}, send_signature=False)
-            for e in price:
-                res[e['symbol']] = float(e['price'])
-        return res
+        area_url, path_url = _TICKER_ENDPOINTS[mode]
+        price = await self.request(area_url, path_url, 'GET', {}, send_signature=False)
+        return {e['symbol']: float(e['price']) for e in price}
 
     async def set_bnb_burn(self, spot_bnb_burn: bool, interest_bnb_burn: bool):
         """
@@ -719,13 +1017,10 @@ class Client(object):
         :param mode: 只能为MAIN、FUTURE
         :param stream_name: 要订阅的数据流名字
         """
-        if mode != 'MAIN' and mode != 'FUTURE':
+        if mode not in _MODES_SPOT_FUTURE:
             raise Exception('mode只能为MAIN、FUTURE')
 
-        if mode == 'MAIN':
-            ws = await websockets.connect('wss://stream.{}:9443/ws/{}'.format(base_url, stream_name))
-        else:
-            ws = await websockets.connect('wss://fstream.{}/ws/{}'.format(base_url, stream_name))
+        ws = await websockets.connect(_WEBSOCKET_URLS[mode].format(base_url, stream_name))
 
         return ws
 
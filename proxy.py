@@ -1,54 +1,148 @@
-from email import header
-from types import MethodDescriptorType
-from flask import Flask, request
+from aiohttp import web
+from werkzeug.serving import generate_adhoc_ssl_context
 
+import asyncio
+import httpx
 import json5 as json
+import orjson
 import traceback
-import requests
 
-# 初始化flask框架
-app = Flask(__name__)
+# 允许转发的请求方法
+_ROOT_METHODS = frozenset({'POST', 'GET'})
+_BATCH_METHODS = frozenset({'POST', 'GET', 'PUT'})
+# /batch单次最多接收的请求数量，以及同时转发到币安的最大并发数
+MAX_BATCH_ITEMS = 100
+MAX_BATCH_CONCURRENCY = 32
+
+# 初始化aiohttp框架
+app = web.Application()
+
+# 共用的session，在启动时创建，复用到币安的连接，避免每次转发都重新进行DNS查询和TLS握手
+SESSION: httpx.AsyncClient = None
+
+
+def load_config() -> dict:
+    """
+    读取配置文件
+    """
+    with open('config.json', 'r', encoding='utf-8') as f:
+        return json.loads(f.read())
+
+
+def make_headers(api_key: str) -> dict:
+    """
+    根据客户端传入的api_key生成请求头，客户端必须传入api_key
+    """
+    if api_key is None:
+        raise Exception('需要传入api_key')
+    return {
+        'X-MBX-APIKEY': api_key
+    }
+
+
+async def on_startup(_):
+    global SESSION
+    # 开启HTTP/2，并发转发可以复用同一个到币安的连接
+    SESSION = httpx.AsyncClient(
+        http2=True, timeout=httpx.Timeout(10.0, connect=3.0),
+        limits=httpx.Limits(max_connections=100, max_keepalive_connections=50, keepalive_expiry=75))
+
+
+async def on_cleanup(_):
+    await SESSION.aclose()
+
+
+def dumps(obj) -> str:
+    """
+    返回给客户端的json使用orjson序列化
+    """
+    return orjson.dumps(obj).decode()
+
+
+app.on_startup.append(on_startup)
+app.on_cleanup.append(on_cleanup)
+
 
 # 用于客户端进行HTTP交互的端口
-@app.route('/', methods=['POST'])
-def root():
+async def root(request: web.Request):
     try:
-        method: str = request.form['method'].upper()
-        url: str = request.form['url']
-        api_key = json.loads(request.form['api_key'])
-
-        headers = {
-            'X-MBX-APIKEY': api_key
-        }
-
-        if method == 'POST':
-            response = requests.post(url, headers=headers)
-        elif method == 'GET':
-            response = requests.get(url, headers=headers)
-        else:
-            raise('method必须为POST或者为GET')
-        
-        if response.status_code == 200:
-            return json.dumps({
+        form = await request.post()
+        method: str = form['method'].upper()
+        url: str = form['url']
+        api_key = form.get('api_key')
+        # 兼容以json字符串格式传入的api_key
+        if api_key is not None and api_key.startswith('"'):
+            api_key = orjson.loads(api_key)
+        headers = make_headers(api_key)
+
+        if method not in _ROOT_METHODS:
+            raise Exception('method必须为POST或者为GET')
+        response = await SESSION.request(method, url, headers=headers)
+        text = response.text
+        status = response.status_code
+
+        if status == 200:
+            return web.json_response({
                 'msg': 'success',
-                'data': response.text
-            })
+                'data': text
+            }, dumps=dumps)
         else:
-            return json.dumps({
+            return web.json_response({
                 'msg': 'error',
-                'data': response.text
-            })
+                'data': text
+            }, dumps=dumps)
     except:
-        return json.dumps({
+        return web.json_response({
             'msg': 'error',
             'traceback': traceback.format_exc(),
-        })
+        }, dumps=dumps)
+
+
+# 批量转发，接收{method, url, api_key}的json数组，并发请求币安后按顺序返回结果
+async def batch(request: web.Request):
+    try:
+        items = orjson.loads(await request.read())
+        if not isinstance(items, list):
+            raise Exception('请求内容必须为json数组')
+        if len(items) > MAX_BATCH_ITEMS:
+            raise Exception('单次批量请求最多{}个'.format(MAX_BATCH_ITEMS))
+        for item in items:
+            if item['method'].upper() not in _BATCH_METHODS:
+                raise Exception('method必须为POST、GET或者PUT')
+
+        # 限制同时转发的数量，避免一次批量请求占满连接池
+        semaphore = asyncio.Semaphore(max(1, min(MAX_BATCH_CONCURRENCY, len(items))))
+
+        async def relay(item: dict) -> dict:
+            try:
+                async with semaphore:
+                    response = await SESSION.request(item['method'].upper(), item['url'],
+                                                     headers=make_headers(item.get('api_key')))
+                return {
+                    'status': response.status_code,
+                    'data': response.text
+                }
+            except:
+                return {
+                    'status': 0,
+                    'data': traceback.format_exc()
+                }
+
+        return web.json_response(await asyncio.gather(*[relay(item) for item in items]), dumps=dumps)
+    except:
+        return web.json_response({
+            'msg': 'error',
+            'traceback': traceback.format_exc(),
+        }, dumps=dumps)
+
+
+app.router.add_post('/', root)
+app.router.add_post('/batch', batch)
 
 
 if __name__ == '__main__':
     # 读取配置文件
-    with open('config.json', 'r', encoding='utf-8') as f:
-        config = json.loads(f.read())
+    config = load_config()
 
     print('检查配置文件是否有效...', end='')
     if 'port' in config and isinstance(config['port'], int) and \
@@ -56,10 +150,11 @@ if __name__ == '__main__':
         print('OK')
     else:
         print('ERROR')
-        raise('配置文件无效，请检查port输入是否正确')
+        raise Exception('配置文件无效，请检查port输入是否正确')
 
     ip = '0.0.0.0'
     port = config['port']
 
     print('即将运行http服务器{}:{}'.format(ip, port))
-    app.run(ip, port, debug=False, ssl_context='adhoc')
+    # 和之前一样使用自签名证书进行https加密
+    web.run_app(app, host=ip, port=port, ssl_context=generate_adhoc_ssl_context())